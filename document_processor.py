@@ -1,15 +1,27 @@
 from abc import ABC, abstractmethod
 import os
-from pathlib import Path
-from typing import List, Set, Dict, Tuple, Any, Optional
+from typing import List, Set, Dict, Tuple, Any, Optional, Iterator, TextIO
 import json
 import numpy as np
-from markitdown import MarkItDown
+from markitdown import MarkItDown, StreamInfo
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.fields import RequestField
+from urllib3.filepost import choose_boundary
 import concurrent.futures
+import multiprocessing
 import threading
+import hashlib
+import shutil
+import io
+import sqlite3
+import mmap
+import tempfile
+import ssl
+import itertools
+from dataclasses import dataclass
 from functools import partial
-from pathlib import Path
 
 # Import ollama for embeddings
 try:
@@ -18,11 +30,37 @@ except ImportError:
     print("Warning: ollama package not found. Embeddings functionality will be disabled.")
     ollama = None
 
+# Import httpx, the HTTP client used by ollama, for its request timeouts, limits and errors
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Import orjson for faster JSON serialization, falling back to the standard library
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _split_path(file_path: str) -> Tuple[str, str]:
+    """
+    Split a file path into its name without extension and its base name
+    
+    Args:
+        file_path: Path to split
+        
+    Returns:
+        Tuple of (name without extension, base name)
+    """
+    base_name = os.path.basename(file_path)
+    return os.path.splitext(base_name)[0], base_name
+
 
 class FileFinder(ABC):
     """Interface for file finding strategies"""
     @abstractmethod
-    def find_files(self, directory: str) -> List[str]:
+    def find_files(self, directory: str) -> Iterator[str]:
         """Find files in the specified directory"""
         pass
 
@@ -38,6 +76,9 @@ class DocumentProcessor(ABC):
 class EmbeddingGenerator(ABC):
     """Interface for generating embeddings from text"""
     
+    # Extension of the files written by save_embeddings
+    file_extension = ".npy"
+    
     @abstractmethod
     def generate_embeddings(self, text: str) -> Any:
         """
@@ -51,6 +92,19 @@ class EmbeddingGenerator(ABC):
         """
         pass
     
+    def generate_embeddings_batch(self, texts: List[str], hashes: Optional[List[str]] = None) -> List[Any]:
+        """
+        Generate embeddings for several texts at once
+        
+        Args:
+            texts: Texts to generate embeddings for
+            hashes: SHA-256 hex digests of the texts, if the caller already computed them
+            
+        Returns:
+            Embeddings for each text, in the same order
+        """
+        return [self.generate_embeddings(text) for text in texts]
+    
     @abstractmethod
     def save_embeddings(self, embeddings: Any, file_path: str) -> None:
         """
@@ -78,25 +132,169 @@ class FileUploader(ABC):
             Response data from the upload service
         """
         pass
+    
+    def upload_files_batch(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Upload several files to an external service
+        
+        Args:
+            file_paths: Paths to the files to upload
+            
+        Returns:
+            Response data from the upload service for each file, in the same order
+        """
+        return [self.upload_file(file_path) for file_path in file_paths]
+    
+    @property
+    def batch_uploads(self) -> bool:
+        """Whether upload_files_batch sends several files per request"""
+        return False
+
+
+class Chunker:
+    """Splits long texts into overlapping chunks that fit in an embedding model's context"""
+    
+    def __init__(self, chunk_size: int = 512, overlap: int = 64):
+        """
+        Initialize with chunk sizes, measured in whitespace-separated words
+        
+        Args:
+            chunk_size: Maximum number of words per chunk
+            overlap: Number of words shared by consecutive chunks
+        """
+        if overlap >= chunk_size:
+            raise ValueError("overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+    
+    def chunk(self, text: str) -> List[str]:
+        """
+        Split a text into chunks
+        
+        Args:
+            text: Text to split
+            
+        Returns:
+            List of chunks, or the text itself if it fits in a single chunk
+        """
+        words = text.split()
+        if len(words) <= self.chunk_size:
+            return [text]
+        
+        step = self.chunk_size - self.overlap
+        return [
+            ' '.join(words[i:i + self.chunk_size])
+            for i in range(0, len(words) - self.overlap, step)
+        ]
+
+
+class EmbeddingCache:
+    """On-disk cache of embeddings keyed by content hash and model, stored in SQLite"""
+    
+    def __init__(self, db_path: str):
+        """
+        Initialize with the path of the SQLite database
+        
+        Args:
+            db_path: Path to the cache database, created if it doesn't exist
+        """
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "hash TEXT NOT NULL, model TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (hash, model))"
+        )
+        self.conn.commit()
+    
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached embeddings
+        
+        Args:
+            model: Model that generated the embeddings
+            hashes: Content hashes to look up
+            
+        Returns:
+            Dictionary mapping the cached hashes to their embeddings
+        """
+        result = {}
+        unique_hashes = list(set(hashes))
+        with self.lock:
+            # Stay below SQLite's limit on query parameters
+            for i in range(0, len(unique_hashes), 500):
+                chunk = unique_hashes[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *chunk]
+                )
+                for content_hash, vector in rows:
+                    result[content_hash] = np.frombuffer(vector, dtype=np.float16).astype(np.float32)
+        return result
+    
+    def put_many(self, model: str, items: List[Tuple[str, Any]]) -> None:
+        """
+        Store embeddings in the cache
+        
+        Args:
+            model: Model that generated the embeddings
+            items: List of (content_hash, embeddings) tuples
+        """
+        rows = [
+            (content_hash, model, np.asarray(embeddings, dtype=np.float16).tobytes())
+            for content_hash, embeddings in items
+        ]
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings (hash, model, vector) VALUES (?, ?, ?)", rows)
+            self.conn.commit()
 
 
 class OllamaEmbeddingGenerator(EmbeddingGenerator):
     """Implementation of EmbeddingGenerator using Ollama"""
     
-    def __init__(self, model: str = "nomic-embed-text", base_url: str = "http://localhost:11434", api_key: str = None):
+    def __init__(self, model: str = "nomic-embed-text", base_url: str = "http://localhost:11434", api_key: str = None, chunker: Chunker = None, quantize: bool = False, batch_size: int = 32, cache: EmbeddingCache = None, min_batch_size: int = 1, max_batch_size: int = 64):
         """
         Initialize with Ollama model configuration
         
         Args:
             model: Ollama model to use for embeddings
+            chunker: Splits long texts before embedding them (defaults to Chunker())
+            quantize: Whether to store embeddings as int8 with a per-vector scale instead of float16
+            batch_size: Number of texts sent to Ollama per request to start with, adapted
+                between min_batch_size and max_batch_size as requests succeed or fail
+            cache: Cache of previously generated embeddings (optional)
+            min_batch_size: Smallest number of texts per request
+            max_batch_size: Largest number of texts per request
         """
         self.model = model
+        self.min_batch_size = max(1, min_batch_size)
+        self.max_batch_size = max(self.min_batch_size, max_batch_size)
+        self.batch_size = min(max(batch_size, self.min_batch_size), self.max_batch_size)
+        self._batch_successes = 0
+        self._batch_lock = threading.Lock()
+        
+        # Cleared once the server shows it has no /api/embed endpoint
+        self._embed_endpoint_supported = True
+        self.cache = cache
+        self.chunker = chunker or Chunker()
+        self.quantize = quantize
+        self.file_extension = ".npz" if quantize else ".npy"
     
         headers = None
         if api_key is not None:
             headers = {'Authorization': f'Bearer {api_key}'}
 
-        self.client = Client(host=base_url, headers=headers)
+        # Keep connections alive across the many embedding requests of a run
+        self.client = Client(
+            host=base_url,
+            headers=headers,
+            timeout=httpx.Timeout(60.0),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=32, keepalive_expiry=30.0)
+        )
         
     def generate_embeddings(self, text: str) -> Any:
         """
@@ -108,18 +306,188 @@ class OllamaEmbeddingGenerator(EmbeddingGenerator):
         Returns:
             Embeddings from Ollama or None if unavailable
         """
-        return None    
+        # Go through the batch path, so single texts are chunked and cached the same way
+        return self.generate_embeddings_batch([text])[0]
+    
+    def _post(self, path: str, payload: Dict[str, Any]) -> 'httpx.Response':
+        """
+        Post a request to the Ollama API, encoding the body with orjson when available
+        
+        Args:
+            path: API path to post to
+            payload: JSON request body
+            
+        Returns:
+            Response from Ollama
+        """
+        if orjson is not None:
+            return self.client._client.post(path, content=orjson.dumps(payload))
+        return self.client._client.post(path, json=payload)
+    
+    def _is_missing_endpoint(self, response: 'httpx.Response') -> bool:
+        """
+        Check whether a response is a 404 for an unknown API path
+        
+        Ollama answers requests for a model it does not have with a 404 too, but
+        with a JSON error body, while unknown paths get a plain text 404.
+        
+        Args:
+            response: Response from Ollama
+            
+        Returns:
+            True if the endpoint does not exist on the server
+        """
+        if response.status_code != 404:
+            return False
         try:
-            response = self.client.embeddings(model=self.model, prompt=text)
-            return response.get('embedding')
+            data = response.json()
+        except ValueError:
+            return True
+        return not (isinstance(data, dict) and 'error' in data)
+    
+    def _embed(self, inputs: List[str]) -> List[List[float]]:
+        """
+        Embed texts with a single /api/embed request
+        
+        Posts to the API directly, parsing the response without building ollama's
+        response models. Falls back to one /api/embeddings request per text for
+        Ollama servers without the batch endpoint, and keeps using it once the
+        endpoint is known to be missing.
+        
+        Args:
+            inputs: Texts to embed
+            
+        Returns:
+            Embedding of each text
+        """
+        if self._embed_endpoint_supported:
+            response = self._post('/api/embed', {'model': self.model, 'input': inputs})
+            if not self._is_missing_endpoint(response):
+                response.raise_for_status()
+                data = orjson.loads(response.content) if orjson is not None else response.json()
+                if 'embeddings' in data:
+                    return data['embeddings']
+            self._embed_endpoint_supported = False
+        
+        embeddings = []
+        for text in inputs:
+            response = self._post('/api/embeddings', {'model': self.model, 'prompt': text})
+            response.raise_for_status()
+            data = orjson.loads(response.content) if orjson is not None else response.json()
+            embeddings.append(data['embedding'])
+        return embeddings
+    
+    def _embed_adaptive(self, inputs: List[str]) -> List[List[float]]:
+        """
+        Embed texts in requests of the current batch size, adapting it to the server
+        
+        The batch size is halved when Ollama fails with a server error or times out,
+        and the failed texts are retried in smaller requests. It grows by 4 again
+        after 3 consecutive successful requests.
+        
+        Args:
+            inputs: Texts to embed
+            
+        Returns:
+            Embedding of each text
+        """
+        vectors = []
+        start = 0
+        while start < len(inputs):
+            with self._batch_lock:
+                size = self.batch_size
+            window = inputs[start:start + size]
+            
+            try:
+                vectors.extend(self._embed(window))
+            except (httpx.TimeoutException, httpx.HTTPStatusError) as e:
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+                    raise
+                with self._batch_lock:
+                    self._batch_successes = 0
+                    if size <= self.min_batch_size:
+                        raise
+                    self.batch_size = max(self.min_batch_size, min(self.batch_size, size // 2))
+                continue
+            
+            start += len(window)
+            with self._batch_lock:
+                self._batch_successes += 1
+                if self._batch_successes >= 3:
+                    self.batch_size = min(self.max_batch_size, self.batch_size + 4)
+                    self._batch_successes = 0
+        return vectors
+    
+    def generate_embeddings_batch(self, texts: List[str], hashes: Optional[List[str]] = None) -> List[Any]:
+        """
+        Generate embeddings for several texts in as few Ollama requests as possible
+        
+        Texts found in the cache are not sent to Ollama, and identical texts or chunks
+        within the batch are only sent once. Long texts are split into chunks, which
+        would otherwise be truncated by the model, and the embeddings of a text's
+        chunks are averaged.
+        
+        Args:
+            texts: Texts to generate embeddings for
+            hashes: SHA-256 hex digests of the texts, computed here if not given
+            
+        Returns:
+            Embeddings for each text, or None for texts whose embeddings are unavailable
+        """
+        if hashes is None:
+            hashes = [hashlib.sha256(text.encode('utf-8')).hexdigest() for text in texts]
+        result = [None] * len(texts)
+        
+        if self.cache is not None:
+            cached = self.cache.get_many(self.model, hashes)
+            for i, content_hash in enumerate(hashes):
+                result[i] = cached.get(content_hash)
+        
+        # Embed each distinct uncached text once
+        first_index = {}
+        for i, content_hash in enumerate(hashes):
+            if result[i] is None:
+                first_index.setdefault(content_hash, i)
+        uncached = list(first_index.values())
+        if not uncached:
+            return result
+        
+        # Chunks shared between texts, such as boilerplate sections, are also embedded once
+        chunk_ids = {}
+        text_chunk_ids = []
+        for i in uncached:
+            text_chunk_ids.append([
+                chunk_ids.setdefault(chunk, len(chunk_ids)) for chunk in self.chunker.chunk(texts[i])
+            ])
+        chunks = list(chunk_ids)
+            
+        try:
+            embeddings = np.asarray(self._embed_adaptive(chunks), dtype=np.float32)
         except Exception as e:
             print(f"Error generating embeddings: {str(e)}")
-            return None
+            return result
+        
+        for i, ids in zip(uncached, text_chunk_ids):
+            result[i] = embeddings[ids].mean(axis=0)
+        
+        if self.cache is not None:
+            self.cache.put_many(self.model, [(hashes[i], result[i]) for i in uncached])
+        
+        # Duplicates share the embedding of the first occurrence
+        for i, content_hash in enumerate(hashes):
+            if result[i] is None:
+                result[i] = result[first_index[content_hash]]
+        return result
             
     def save_embeddings(self, embeddings: Any, file_path: str) -> None:
         """
         Save embeddings to a file
         
+        Embeddings are L2-normalized, so cosine similarity is a plain dot product,
+        and stored as a float16 NumPy array (.npy). When quantizing, they are stored
+        as an .npz archive holding an int8 array 'embedding' and a float32 'scale',
+        the normalized vector being approximately embedding * scale.
+        
         Args:
             embeddings: Embeddings to save
             file_path: Path to save embeddings to
@@ -128,13 +496,17 @@ class OllamaEmbeddingGenerator(EmbeddingGenerator):
             return
             
         try:
-            # Also save a JSON version for human readability/debugging
-            with open(file_path, 'w') as f:
-                json.dump({
-                    'model': self.model,
-                    'dimensions': len(embeddings),
-                    'embedding': embeddings
-                }, f, indent=2)
+            vector = np.asarray(embeddings, dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector, axis=-1, keepdims=True) + 1e-12)
+            
+            if self.quantize:
+                scale = np.float32(np.abs(vector).max() / 127) or np.float32(1.0)
+                quantized = np.round(vector / scale).astype(np.int8)
+                with open(file_path, 'wb') as f:
+                    np.savez(f, embedding=quantized, scale=scale)
+            else:
+                # Store as a float16 NumPy array, far smaller and faster to load than JSON
+                np.save(file_path, vector.astype(np.float16), allow_pickle=False)
                 
         except Exception as e:
             print(f"Error saving embeddings: {str(e)}")
@@ -152,20 +524,152 @@ class NullEmbeddingGenerator(EmbeddingGenerator):
         pass
 
 
+def _ca_bundle() -> str:
+    """
+    Resolve the CA bundle used to verify API connections, the way requests resolves it
+    
+    Returns:
+        Path to a CA bundle file or a directory of CA certificates
+    """
+    return os.environ.get('REQUESTS_CA_BUNDLE') or os.environ.get('CURL_CA_BUNDLE') or requests.certs.where()
+
+
+class _SharedTLSAdapter(HTTPAdapter):
+    """
+    HTTPAdapter verifying connections against the default CA bundle with one preloaded
+    SSL context, so the bundle is parsed once instead of for every new connection
+    
+    The context is only given to the connection pools of requests verified with that
+    bundle and without a client certificate, any other verify or cert value goes
+    through requests' normal handling and never touches the shared context.
+    """
+    
+    def __init__(self, ca_bundle: str, *args, **kwargs):
+        self.ca_bundle = ca_bundle
+        if os.path.isdir(ca_bundle):
+            self._ssl_context = ssl.create_default_context(capath=ca_bundle)
+        else:
+            self._ssl_context = ssl.create_default_context(cafile=ca_bundle)
+        super().__init__(*args, **kwargs)
+    
+    def _uses_shared_context(self, verify: Any, cert: Any) -> bool:
+        return cert is None and (verify is True or verify == self.ca_bundle)
+    
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        if self._uses_shared_context(verify, cert):
+            pool_kwargs['ssl_context'] = self._ssl_context
+            pool_kwargs.pop('ca_certs', None)
+            pool_kwargs.pop('ca_cert_dir', None)
+        return host_params, pool_kwargs
+    
+    def cert_verify(self, conn, url, verify, cert):
+        super().cert_verify(conn, url, verify, cert)
+        if self._uses_shared_context(verify, cert):
+            # The shared context already holds the bundle, don't load it again per connection
+            conn.ca_certs = None
+            conn.ca_cert_dir = None
+
+
+# Markdown files at least this large are uploaded from a memory map instead of being read
+_MMAP_UPLOAD_THRESHOLD = 8 * 1024 * 1024
+
+
+class _MultipartFileBody:
+    """
+    multipart/form-data body for a single memory-mapped file, read as the request is sent
+    
+    Only the part headers are built in memory, the content is sliced from the map in
+    blocks by the HTTP connection. Supports tell/seek so the body can be resent on retries.
+    """
+    
+    def __init__(self, field_name: str, filename: str, data: mmap.mmap, content_type: str):
+        """
+        Initialize the body
+        
+        Args:
+            field_name: Form field name of the file
+            filename: File name sent to the server
+            data: Memory map of the file content
+            content_type: Content type of the file
+        """
+        boundary = choose_boundary()
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        
+        field = RequestField(name=field_name, data=b'', filename=filename)
+        field.make_multipart(content_type=content_type)
+        self._parts = [
+            f"--{boundary}\r\n{field.render_headers()}".encode('utf-8'),
+            data,
+            f"\r\n--{boundary}--\r\n".encode('utf-8')
+        ]
+        self._length = sum(len(part) for part in self._parts)
+        self._pos = 0
+    
+    def __len__(self) -> int:
+        return self._length
+    
+    def tell(self) -> int:
+        return self._pos
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._length}[whence]
+        self._pos = min(max(base + offset, 0), self._length)
+        return self._pos
+    
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._length - self._pos
+        
+        chunks = []
+        start = 0
+        for part in self._parts:
+            end = start + len(part)
+            if size > 0 and start <= self._pos < end:
+                chunk = part[self._pos - start:self._pos - start + size]
+                chunks.append(chunk)
+                self._pos += len(chunk)
+                size -= len(chunk)
+            start = end
+        return b''.join(chunks)
+
+
 class ApiFileUploader(FileUploader):
     """Implementation of FileUploader using API requests"""
     
-    def __init__(self, api_url: str, token: str):
+    def __init__(self, api_url: str, token: str, pool_size: int = 64, batch_uploads: bool = False):
         """
         Initialize with API URL and authentication token
         
         Args:
             api_url: Base URL of the API
             token: Authentication token
+            pool_size: Number of connections kept open to the API
+            batch_uploads: Whether to send several files per request, for APIs that
+                accept multiple 'file' parts and return one result per file
         """
         self.api_url = api_url.rstrip('/')
         self.token = token
         
+        # Reuse connections across uploads instead of connecting for every file
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {self.token}',
+            'Accept': 'application/json'
+        })
+        self.session.verify = _ca_bundle()
+        adapter = _SharedTLSAdapter(
+            self.session.verify,
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        # Cleared once the API shows it only accepts one file per request
+        self._batch_supported = batch_uploads
+        
     def upload_file(self, file_path: str) -> Dict[str, Any]:
         """
         Upload a file to the API
@@ -177,23 +681,74 @@ class ApiFileUploader(FileUploader):
             Response data from the API
         """
         url = f'{self.api_url}/api/v1/files/'
-        headers = {
-            'Authorization': f'Bearer {self.token}',
-            'Accept': 'application/json'
-        }
         
         try:
+            _, filename = _split_path(file_path)
             with open(file_path, 'rb') as f:
-                filename = Path(file_path).name
-                files = {'file': (filename, f, 'text/markdown')}
-                response = requests.post(url, headers=headers, files=files)
-                response.raise_for_status()  # Raise exception for 4XX/5XX responses
-                result = response.json()
-                return result
+                if os.fstat(f.fileno()).st_size >= _MMAP_UPLOAD_THRESHOLD:
+                    # Send large files straight from the page cache instead of copying them into the body
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        body = _MultipartFileBody('file', filename, data, 'text/markdown')
+                        response = self.session.post(url, data=body, headers={'Content-Type': body.content_type})
+                else:
+                    # Markdown files are usually small, read them at once so the multipart body is built in one go
+                    files = {'file': (filename, f.read(), 'text/markdown')}
+                    response = self.session.post(url, files=files)
+            response.raise_for_status()  # Raise exception for 4XX/5XX responses
+            result = response.json()
+            return result
 
         except Exception as e:
             print(f"Error uploading file {file_path}: {str(e)}")
             return {"error": str(e), "file_path": file_path}
+    
+    @property
+    def batch_uploads(self) -> bool:
+        """Whether upload_files_batch sends several files per request"""
+        return self._batch_supported
+    
+    def upload_files_batch(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Upload several files to the API in a single multipart request
+        
+        Falls back to uploading the files one by one if batching is disabled or the API
+        does not return one result per file.
+        
+        Args:
+            file_paths: Paths to the files to upload
+            
+        Returns:
+            Response data from the API for each file, in the same order
+        """
+        if len(file_paths) == 1 or not self._batch_supported:
+            return [self.upload_file(file_path) for file_path in file_paths]
+        
+        url = f'{self.api_url}/api/v1/files/'
+        
+        try:
+            files = []
+            for file_path in file_paths:
+                with open(file_path, 'rb') as f:
+                    files.append(('file', (_split_path(file_path)[1], f.read(), 'text/markdown')))
+            response = self.session.post(url, files=files)
+            if 400 <= response.status_code < 500:
+                # The API rejected the batched form
+                self._batch_supported = False
+            response.raise_for_status()
+            result = response.json()
+            
+        except Exception as e:
+            print(f"Error uploading batch of {len(file_paths)} files, uploading them one by one: {str(e)}")
+            return [self.upload_file(file_path) for file_path in file_paths]
+        
+        if isinstance(result, list) and len(result) == len(file_paths):
+            return result
+        
+        # The API only accepts one file per request, and which of the files it kept
+        # is unknown, so upload all of them on their own
+        print(f"API returned {type(result).__name__} for a batch of {len(file_paths)} files, uploading them one by one")
+        self._batch_supported = False
+        return [self.upload_file(file_path) for file_path in file_paths]
 
 
 class NullFileUploader(FileUploader):
@@ -202,6 +757,10 @@ class NullFileUploader(FileUploader):
     def upload_file(self, file_path: str) -> Dict[str, Any]:
         """No-op implementation"""
         return {"status": "skipped", "file_path": file_path}
+    
+    def upload_files_batch(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """No-op implementation"""
+        return [{"status": "skipped", "file_path": file_path} for file_path in file_paths]
 
 
 class ExtensionBasedFileFinder(FileFinder):
@@ -215,8 +774,9 @@ class ExtensionBasedFileFinder(FileFinder):
             extensions: Set of file extensions (without the dot)
         """
         self.extensions = extensions
+        self._extension_set = frozenset(ext.lower() for ext in extensions)
     
-    def find_files(self, directory: str) -> List[str]:
+    def find_files(self, directory: str) -> Iterator[str]:
         """
         Find all files with the specified extensions in the directory
         
@@ -224,14 +784,27 @@ class ExtensionBasedFileFinder(FileFinder):
             directory: Path to the directory to search
             
         Returns:
-            List of file paths matching the extensions
+            Iterator over file paths matching the extensions, yielded as they are found
         """
-        result = []
-        for root, _, files in os.walk(directory):
-            for file in files:
-                if any(file.lower().endswith(f".{ext}") for ext in self.extensions):
-                    result.append(os.path.join(root, file))
-        return result
+        stack = [directory]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except OSError:
+                # Skip unreadable directories, like os.walk does
+                continue
+            
+            # DirEntry caches the file type from readdir, so no extra stat calls
+            with entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            stack.append(entry.path)
+                    else:
+                        # Look up only the lowercased suffix in the extension set
+                        _, dot, ext = entry.name.rpartition('.')
+                        if dot and ext.lower() in self._extension_set and entry.is_file():
+                            yield entry.path
 
 
 class MarkItDownProcessor(DocumentProcessor):
@@ -244,7 +817,24 @@ class MarkItDownProcessor(DocumentProcessor):
         Args:
             enable_plugins: Whether to enable plugins in MarkItDown
         """
-        self.md = MarkItDown(enable_plugins=enable_plugins)
+        self.enable_plugins = enable_plugins
+        self._md = MarkItDown(enable_plugins=enable_plugins)
+    
+    @property
+    def md(self) -> MarkItDown:
+        """MarkItDown instance, recreated on first use after unpickling"""
+        if self._md is None:
+            self._md = MarkItDown(enable_plugins=self.enable_plugins)
+        return self._md
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Drop the MarkItDown instance when pickling, it is rebuilt lazily
+        in the worker process that receives this processor
+        """
+        state = self.__dict__.copy()
+        state['_md'] = None
+        return state
     
     def process_document(self, file_path: str) -> str:
         """
@@ -256,10 +846,106 @@ class MarkItDownProcessor(DocumentProcessor):
         Returns:
             Extracted text content
         """
-        result = self.md.convert(file_path)
+        # Read the file once and let MarkItDown work on the in-memory copy
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        
+        stream_info = StreamInfo(
+            local_path=file_path,
+            extension=os.path.splitext(file_path)[1],
+            filename=os.path.basename(file_path)
+        )
+        result = self.md.convert_stream(io.BytesIO(data), stream_info=stream_info)
         return result.text_content
 
 
+# Document processor used by the current worker process, set by _init_worker
+_worker_processor: Optional[DocumentProcessor] = None
+
+
+def _init_worker(document_processor: DocumentProcessor) -> None:
+    """
+    Initialize a worker process with the document processor to use
+    
+    Args:
+        document_processor: Strategy for processing documents
+    """
+    global _worker_processor
+    _worker_processor = document_processor
+
+
+@dataclass
+class ProcessResult:
+    """Outcome of converting a single file, returned to the main thread through its future"""
+    src: str
+    md: str
+    content: str
+    err: Optional[str] = None
+
+
+def _write_markdown(md_filename: str, content: str) -> None:
+    """
+    Write a markdown file through a uniquely named temporary file and rename it,
+    so a partial markdown file is never visible, even with parallel writers
+    
+    Args:
+        md_filename: Path to the markdown output file
+        content: Markdown content
+    """
+    fd, tmp_filename = tempfile.mkstemp(
+        dir=os.path.dirname(md_filename) or '.',
+        prefix=f"{os.path.basename(md_filename)}.",
+        suffix='.tmp'
+    )
+    try:
+        # Encoded once and written in a single call
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content.encode('utf-8'))
+        os.replace(tmp_filename, md_filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+
+def _process_one(file_path: str, md_filename: str) -> ProcessResult:
+    """
+    Convert a single file to markdown inside a worker process
+    
+    Args:
+        file_path: Path to the file to process
+        md_filename: Path to the markdown output file
+        
+    Returns:
+        ProcessResult with the extracted text content (empty on error) and
+        the error message, or None if processing was successful
+    """
+    try:
+        # Process the document
+        content = _worker_processor.process_document(file_path)
+        
+        # Skip empty content
+        if content == '':
+            return ProcessResult(file_path, md_filename, content)
+        
+        # Save content to markdown file
+        _write_markdown(md_filename, content)
+            
+        return ProcessResult(file_path, md_filename, content)
+            
+    except Exception as e:
+        error_message = f"Error processing file: {str(e)}"
+        
+        # Create error markdown file, replacing anything written before the error
+        error_content = (
+            f"# Error processing {os.path.basename(file_path)}\n\n"
+            f"```\n{error_message}\n```\n"
+        )
+        _write_markdown(md_filename, error_content)
+            
+        return ProcessResult(file_path, md_filename, '', error_message)
+
+
 class DocumentProcessingService:
     """Service that finds and processes documents"""
     
@@ -268,7 +954,10 @@ class DocumentProcessingService:
                  document_processor: DocumentProcessor,
                  embedding_generator: EmbeddingGenerator = None,
                  file_uploader: FileUploader = None,
-                 output_dir: str = "output"):
+                 output_dir: str = "output",
+                 embedding_workers: int = 8,
+                 embedding_batch_size: int = 32,
+                 upload_batch_bytes: int = 20 * 1024 * 1024):
         """
         Initialize with strategies for finding and processing files
         
@@ -278,6 +967,9 @@ class DocumentProcessingService:
             embedding_generator: Strategy for generating embeddings (optional)
             file_uploader: Strategy for uploading files (optional)
             output_dir: Directory to save markdown output files
+            embedding_workers: Number of threads generating embeddings while documents are processed
+            embedding_batch_size: Maximum number of documents sent to the embedding generator per request
+            upload_batch_bytes: Maximum total size of the files sent in one upload request
         """
         self.file_finder = file_finder
         self.document_processor = document_processor
@@ -285,14 +977,57 @@ class DocumentProcessingService:
         self.file_uploader = file_uploader or NullFileUploader()
         self.output_dir = output_dir
         self.progress_file = os.path.join(output_dir, "processing_progress.json")
+        self.progress_journal_file = os.path.join(output_dir, "processing_progress.jsonl")
         self.upload_results_file = os.path.join(output_dir, "upload_results.json")
+        self.upload_results_journal_file = os.path.join(output_dir, "upload_results.jsonl")
         
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         
-        # Add locks for thread safety
-        self.progress_lock = threading.Lock()
+        # Progress is only updated by the thread collecting results, upload
+        # results are recorded by the upload threads
         self.upload_results_lock = threading.Lock()
+        
+        # Append-only journals of files processed and uploaded since the last snapshots,
+        # and the threads running embedding requests alongside document processing.
+        # Opened by the first process_directory call and released by close()
+        self._progress_journal: Optional[TextIO] = None
+        self._upload_results_journal: Optional[TextIO] = None
+        self.embedding_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self.embedding_workers = embedding_workers
+        self.embedding_batch_size = embedding_batch_size
+        self.upload_batch_bytes = upload_batch_bytes
+        
+        # Embeddings files of already embedded content, keyed by content hash
+        self._emb_cache: Dict[str, str] = {}
+        self.embedding_cache_lock = threading.Lock()
+    
+    def __enter__(self) -> 'DocumentProcessingService':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+    
+    def _open(self) -> None:
+        """Open the progress journals and start the embedding threads, if not done yet"""
+        if self._progress_journal is None:
+            self._progress_journal = open(self.progress_journal_file, 'a', encoding='utf-8')
+        if self._upload_results_journal is None:
+            self._upload_results_journal = open(self.upload_results_journal_file, 'a', encoding='utf-8')
+        if self.embedding_executor is None:
+            # Embedding requests are I/O bound, run them in threads
+            self.embedding_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.embedding_workers)
+    
+    def close(self) -> None:
+        """Stop the embedding threads and close the progress journals"""
+        if self.embedding_executor is not None:
+            self.embedding_executor.shutdown(wait=True)
+            self.embedding_executor = None
+        for journal in (self._progress_journal, self._upload_results_journal):
+            if journal is not None:
+                journal.close()
+        self._progress_journal = None
+        self._upload_results_journal = None
     
     def _get_markdown_filename(self, file_path: str) -> str:
         """
@@ -304,171 +1039,361 @@ class DocumentProcessingService:
         Returns:
             Path to the markdown output file
         """
-        base_name = os.path.basename(file_path)
-        name_without_ext = os.path.splitext(base_name)[0]
+        name_without_ext, _ = _split_path(file_path)
         return os.path.join(self.output_dir, f"{name_without_ext}.md")
     
-    def _get_embeddings_filename(self, file_path: str) -> str:
+    def _get_embeddings_filename(self, md_filename: str) -> str:
         """
         Generate a embeddings filename for the output file
         
+        The name is derived from the markdown output path, so the original path
+        is not split again.
+        
         Args:
-            file_path: Original file path
+            md_filename: Path to the markdown output file
             
         Returns:
             Path to the embeddings output file
         """
-        base_name = os.path.basename(file_path)
-        name_without_ext = os.path.splitext(base_name)[0]
-        return os.path.join(self.output_dir, f"{name_without_ext}.embeddings")
+        return f"{md_filename[:-len('.md')]}{self.embedding_generator.file_extension}"
+    
+    def _existing_outputs(self) -> Set[str]:
+        """
+        List the files in the output directory with a single directory read
+        
+        Returns:
+            Set of names of the files in the output directory
+        """
+        with os.scandir(self.output_dir) as entries:
+            return {entry.name for entry in entries if entry.is_file()}
+    
+    def _write_snapshot(self, file_path: str, data: Dict[str, Any]) -> None:
+        """
+        Write a JSON snapshot, replacing the previous one only once it is complete
+        
+        Args:
+            file_path: Path to the JSON file
+            data: Data to save
+        """
+        tmp_file = f"{file_path}.tmp"
+        if orjson is not None:
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE))
+        else:
+            with open(tmp_file, 'w') as f:
+                json.dump(data, f)
+                f.write("\n")
+        os.replace(tmp_file, file_path)
+    
+    def _read_snapshot(self, file_path: str) -> Dict[str, Any]:
+        """
+        Read a JSON snapshot, parsing it with orjson when available
+        
+        Args:
+            file_path: Path to the JSON file
+            
+        Returns:
+            Snapshot data, or an empty dictionary if it is missing or unreadable
+        """
+        if not os.path.exists(file_path):
+            return {}
+        
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+            return orjson.loads(data) if orjson is not None else json.loads(data)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return {}
+    
+    def _append_journal(self, journal: TextIO, entry: Dict[str, Any]) -> None:
+        """
+        Append an entry to a JSON lines journal and flush it to disk
+        
+        Args:
+            journal: Open journal file
+            entry: Entry to append
+        """
+        if orjson is not None:
+            journal.write(orjson.dumps(entry).decode('utf-8') + "\n")
+        else:
+            journal.write(json.dumps(entry) + "\n")
+        journal.flush()
+    
+    def _read_journal(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Read the entries of a JSON lines journal
+        
+        Args:
+            file_path: Path to the journal file
+            
+        Returns:
+            Iterator over the journal entries
+        """
+        if not os.path.exists(file_path):
+            return
+        
+        loads = orjson.loads if orjson is not None else json.loads
+        with open(file_path, 'rb') as f:
+            for line in f:
+                try:
+                    yield loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # Partially written line from an interrupted run
+                    continue
     
     def _load_progress(self) -> Dict[str, str]:
         """
-        Load processing progress from JSON file
+        Load processing progress from the JSON snapshot and replay the journal on top of it
         
         Returns:
             Dictionary mapping file paths to output markdown paths
         """
-        if os.path.exists(self.progress_file):
-            try:
-                with open(self.progress_file, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-        return {}
+        progress = self._read_snapshot(self.progress_file)
+        for entry in self._read_journal(self.progress_journal_file):
+            progress[entry["src"]] = entry["md"]
+        return progress
+    
+    def _record_progress(self, progress: Dict[str, str], file_path: str, md_filename: str) -> None:
+        """
+        Mark a file as processed and append it to the progress journal
+        
+        Args:
+            progress: Dictionary mapping file paths to output markdown paths
+            file_path: Original file path
+            md_filename: Path to the markdown output file
+        """
+        progress[file_path] = md_filename
+        self._append_journal(self._progress_journal, {"src": file_path, "md": md_filename})
     
     def _save_progress(self, progress: Dict[str, str]) -> None:
         """
-        Save processing progress to JSON file
+        Save processing progress to JSON file and clear the journal it supersedes
         
         Args:
             progress: Dictionary mapping file paths to output markdown paths
         """
-        with self.progress_lock:
-            with open(self.progress_file, 'w') as f:
-                json.dump(progress, f, indent=2)
+        self._write_snapshot(self.progress_file, progress)
+        self._progress_journal.truncate(0)
     
     def _load_upload_results(self) -> Dict[str, Dict[str, Any]]:
         """
-        Load file upload results from JSON file
+        Load file upload results from the JSON snapshot and replay the journal on top of it
         
         Returns:
             Dictionary mapping markdown file paths to upload results
         """
-        if os.path.exists(self.upload_results_file):
-            try:
-                with open(self.upload_results_file, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-        return {}
+        results = self._read_snapshot(self.upload_results_file)
+        for entry in self._read_journal(self.upload_results_journal_file):
+            results[entry["md"]] = entry["result"]
+        return results
     
     def _save_upload_results(self, results: Dict[str, Dict[str, Any]]) -> None:
         """
-        Save file upload results to JSON file
+        Save file upload results to JSON file and clear the journal it supersedes
         
         Args:
             results: Dictionary mapping markdown file paths to upload results
         """
         with self.upload_results_lock:
-            with open(self.upload_results_file, 'w') as f:
-                json.dump(results, f, indent=2)
+            self._write_snapshot(self.upload_results_file, results)
+            self._upload_results_journal.truncate(0)
     
-    def _process_file(self, file_path: str, progress: Dict[str, str], errors: Dict[str, str]) -> Tuple[str, bool]:
+    def _generate_embeddings(self, batch: List[Tuple[str, str]]) -> Set[str]:
         """
-        Process a single file
+        Generate and save embeddings for the content of processed files
         
         Args:
-            file_path: Path to the file to process
-            progress: Shared progress dictionary
-            errors: Shared errors dictionary
+            batch: List of (md_path, content) tuples
             
         Returns:
-            Tuple containing:
-            - Output markdown path
-            - Whether processing was successful
+            Markdown paths of the files whose embeddings could not be generated
         """
-        # Skip already processed files
-        with self.progress_lock:
-            if file_path in progress and os.path.exists(progress[file_path]):
-                return progress[file_path], True
-                
-        # Generate output filenames
-        md_filename = self._get_markdown_filename(file_path)
-        embeddings_filename = self._get_embeddings_filename(file_path)
+        if isinstance(self.embedding_generator, NullEmbeddingGenerator):
+            return set()
         
-        try:
-            # Process the document
-            content = self.document_processor.process_document(file_path)
-
-            # Skip empty content
-            if content == '':
-                return md_filename, False
-            
-            # Save content to markdown file
-            with open(md_filename, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            # Generate and save embeddings
-            embeddings = self.embedding_generator.generate_embeddings(content)
-            if embeddings is not None:
+        to_embed = []    # (md_path, embeddings_filename, content, content_hash)
+        duplicates = []  # (md_path, embeddings_filename, source embeddings_filename)
+        failed = set()
+        
+        # Only send content that has not been embedded in an earlier batch, the
+        # embedding generator takes care of duplicates within this one
+        for md_filename, content in batch:
+            embeddings_filename = self._get_embeddings_filename(md_filename)
+            content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            with self.embedding_cache_lock:
+                source = self._emb_cache.get(content_hash)
+            if source is not None:
+                duplicates.append((md_filename, embeddings_filename, source))
+            else:
+                to_embed.append((md_filename, embeddings_filename, content, content_hash))
+        
+        if to_embed:
+            texts = [content for _, _, content, _ in to_embed]
+            hashes = [content_hash for _, _, _, content_hash in to_embed]
+            all_embeddings = self.embedding_generator.generate_embeddings_batch(texts, hashes)
+            for (md_filename, embeddings_filename, _, content_hash), embeddings in zip(to_embed, all_embeddings):
+                if embeddings is None:
+                    failed.add(md_filename)
+                    continue
                 self.embedding_generator.save_embeddings(embeddings, embeddings_filename)
+                with self.embedding_cache_lock:
+                    self._emb_cache[content_hash] = embeddings_filename
+        
+        # Copy the embeddings of identical content instead of generating them again
+        for md_filename, embeddings_filename, source in duplicates:
+            if not os.path.exists(source):
+                failed.add(md_filename)
+            elif source != embeddings_filename:
+                shutil.copyfile(source, embeddings_filename)
+        
+        return failed
+    
+    def _submit_embeddings(self,
+                           batch: List[Tuple[str, str, str]],
+                           pending: Dict[concurrent.futures.Future, List[Tuple[str, str]]]) -> None:
+        """
+        Submit a batch of processed files for embedding generation
+        
+        Args:
+            batch: List of (file_path, md_path, content) tuples, cleared once submitted
+            pending: Embedding futures mapped to their (file_path, md_path) tuples
+        """
+        if not batch:
+            return
+        
+        future = self.embedding_executor.submit(
+            self._generate_embeddings,
+            [(md_filename, content) for _, md_filename, content in batch]
+        )
+        pending[future] = [(file_path, md_filename) for file_path, md_filename, _ in batch]
+        batch.clear()
+    
+    def _collect_embeddings(self,
+                            pending: Dict[concurrent.futures.Future, List[Tuple[str, str]]],
+                            progress: Dict[str, str],
+                            errors: Dict[str, str],
+                            wait: bool = False) -> None:
+        """
+        Mark files whose embeddings have been generated as processed
+        
+        Files whose embeddings failed are recorded as errors and left out of the
+        progress, so they are processed again on the next run.
+        
+        Args:
+            pending: Embedding futures mapped to their (file_path, md_path) tuples, completed futures are removed
+            progress: Dictionary mapping file paths to output markdown paths
+            errors: Dictionary mapping file paths to errors
+            wait: Whether to wait for all pending embeddings to complete
+        """
+        if wait:
+            done = list(concurrent.futures.as_completed(pending))
+        else:
+            done = [future for future in pending if future.done()]
             
-            # Update progress
-            with self.progress_lock:
-                progress[file_path] = md_filename
-                
-            return md_filename, True
-                
-        except Exception as e:
-            # Record error
-            error_message = f"Error processing file: {str(e)}"
-            
-            with self.progress_lock:
-                errors[file_path] = error_message
-            
-            # Create error markdown file
-            with open(md_filename, 'w', encoding='utf-8') as f:
-                f.write(f"# Error processing {os.path.basename(file_path)}\n\n")
-                f.write(f"```\n{error_message}\n```\n")
+        for future in done:
+            files = pending.pop(future)
+            error = "Error generating embeddings"
+            try:
+                failed = future.result()
+            except Exception as e:
+                failed = {md_filename for _, md_filename in files}
+                error = f"Error generating embeddings: {str(e)}"
+            for file_path, md_filename in files:
+                if md_filename in failed:
+                    errors[file_path] = error
+                else:
+                    self._record_progress(progress, file_path, md_filename)
+    
+    def _split_upload_batches(self, md_paths: List[str], max_files: int) -> List[List[str]]:
+        """
+        Split markdown files into upload batches bounded by file count and total size
+        
+        Args:
+            md_paths: Paths of the markdown files to upload
+            max_files: Maximum number of files per batch
             
-            # Update progress even for errors
-            with self.progress_lock:
-                progress[file_path] = md_filename
-                
-            return md_filename, False
+        Returns:
+            List of batches of markdown file paths
+        """
+        batches = []
+        batch = []
+        batch_bytes = 0
+        for md_path in md_paths:
+            try:
+                size = os.path.getsize(md_path)
+            except OSError:
+                # Send missing files on their own, so the upload records the error for them alone
+                batches.append([md_path])
+                continue
+            if batch and (len(batch) >= max_files or batch_bytes + size > self.upload_batch_bytes):
+                batches.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(md_path)
+            batch_bytes += size
+        if batch:
+            batches.append(batch)
+        return batches
     
-    def _upload_file(self, file_info: Tuple[str, str], upload_results: Dict[str, Dict[str, Any]], new_upload_results: Dict[str, Dict[str, Any]]) -> None:
+    def _upload_batch(self, md_paths: List[str], upload_results: Dict[str, Dict[str, Any]], new_upload_results: Dict[str, Dict[str, Any]]) -> None:
         """
-        Upload a file to the external service
+        Upload a batch of files to the external service
         
         Args:
-            file_info: Tuple containing (file_path, md_path)
+            md_paths: Paths of the markdown files to upload
             upload_results: Shared upload results dictionary
             new_upload_results: Shared new upload results dictionary
         """
-        file_path, md_path = file_info
+        results = self.file_uploader.upload_files_batch(md_paths)
         
-        # Skip already uploaded files
         with self.upload_results_lock:
-            if md_path in upload_results and upload_results[md_path].get("status") != "error":
-                return
+            for md_path, result in zip(md_paths, results):
+                upload_results[md_path] = result
+                new_upload_results[md_path] = result
+                self._append_journal(self._upload_results_journal, {"md": md_path, "result": result})
+    
+    def _handle_result(self,
+                       future: concurrent.futures.Future,
+                       file_path: str,
+                       progress: Dict[str, str],
+                       errors: Dict[str, str],
+                       embedding_batch: List[Tuple[str, str, str]]) -> None:
+        """
+        Record the result of processing a file
         
-        # Upload the markdown file
-        result = self.file_uploader.upload_file(md_path)
+        Args:
+            future: Completed processing future
+            file_path: Original file path
+            progress: Dictionary mapping file paths to output markdown paths
+            errors: Dictionary mapping file paths to errors
+            embedding_batch: List of (file_path, md_path, content) tuples waiting for embeddings
+        """
+        try:
+            result = future.result()
+        except Exception as e:
+            errors[file_path] = f"Error processing file: {str(e)}"
+            return
         
-        with self.upload_results_lock:
-            upload_results[md_path] = result
-            new_upload_results[md_path] = result
+        if result.err is not None:
+            # Record error, and update progress even for errors
+            errors[result.src] = result.err
+            self._record_progress(progress, result.src, result.md)
+        elif result.content != '':
+            # Generate embeddings in the background, the file counts as
+            # processed once they are saved
+            embedding_batch.append((result.src, result.md, result.content))
     
-    def process_directory(self, directory: str, batch_size: int = 10, max_workers: int = None) -> Tuple[Dict[str, str], Dict[str, str], Dict[str, Dict[str, Any]]]:
+    def process_directory(self, directory: str, batch_size: int = 10, max_workers: int = None, executor_type: str = "process") -> Tuple[Dict[str, str], Dict[str, str], Dict[str, Dict[str, Any]]]:
         """
-        Process all matching documents in the directory in parallel batches, save as markdown, and upload
+        Process all matching documents in the directory in parallel, save as markdown, and upload
         
         Args:
             directory: Path to the directory to process
-            batch_size: Number of files to process in parallel
-            max_workers: Maximum number of worker threads (defaults to min(32, os.cpu_count() + 4))
+            batch_size: Number of processed files between progress reports, and maximum number of files per upload request
+            max_workers: Maximum number of worker processes for processing (defaults to os.cpu_count())
+                and worker threads for uploading (defaults to min(32, os.cpu_count() + 4))
+            executor_type: Whether to process documents in worker processes ("process") or threads ("thread")
             
         Returns:
             Tuple containing:
@@ -476,85 +1401,157 @@ class DocumentProcessingService:
             - Dictionary mapping file paths to errors (if any)
             - Dictionary mapping markdown file paths to upload results
         """
+        self._open()
+        
         # Load existing progress and upload results
         progress = self._load_progress()
         upload_results = self._load_upload_results()
         errors = {}
         new_upload_results = {}
         
-        # Find all files to process
-        files = self.file_finder.find_files(directory)
+        # List the output directory once instead of checking every markdown file
+        existing_outputs = self._existing_outputs()
         
-        # Skip already processed files
-        files_to_process = []
-        for file_path in files:
-            if file_path not in progress or not os.path.exists(progress[file_path]):
-                files_to_process.append(file_path)
-        
-        # Process files in parallel batches
-        if files_to_process:
-            print(f"Processing {len(files_to_process)} files in batches of {batch_size}...")
+        # Process files in parallel workers. Conversion is CPU bound, so processes are
+        # used by default. Forked workers inherit the document processor built in
+        # this process instead of rebuilding it
+        workers = max_workers or os.cpu_count()
+        if executor_type == "process":
+            mp_context = None
+            if 'fork' in multiprocessing.get_all_start_methods():
+                mp_context = multiprocessing.get_context('fork')
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(self.document_processor,)
+            )
+        elif executor_type == "thread":
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(self.document_processor,)
+            )
+        else:
+            raise ValueError(f"Unknown executor type: {executor_type}")
             
-            # Process files in parallel
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Create a partial function with shared dictionaries
-                process_file_func = partial(self._process_file, progress=progress, errors=errors)
-                
-                # Process files in batches
-                for i in range(0, len(files_to_process), batch_size):
-                    batch = files_to_process[i:i+batch_size]
-                    print(f"Processing batch {i//batch_size + 1}/{(len(files_to_process) + batch_size - 1)//batch_size} ({len(batch)} files)...")
+        with executor:
+            # Skip already processed files
+            files_to_process = (
+                file_path for file_path in self.file_finder.find_files(directory)
+                if not (file_path in progress and os.path.basename(progress[file_path]) in existing_outputs)
+            )
+            
+            # Keep a bounded number of files in flight, submitting the next file found as
+            # each one completes, so results are handled while the tree is still being
+            # walked instead of piling up in completed futures
+            max_in_flight = workers * 4
+            futures = {}
+            for file_path in itertools.islice(files_to_process, max_in_flight):
+                futures[executor.submit(_process_one, file_path, self._get_markdown_filename(file_path))] = file_path
+            
+            if futures:
+                print(f"Processing files with {workers} {executor_type} workers...")
+            
+            embedding_batch = []
+            pending_embeddings = {}
+            processed_any = bool(futures)
+            completed = 0
+            
+            while futures:
+                done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    file_path = futures.pop(future)
+                    next_path = next(files_to_process, None)
+                    if next_path is not None:
+                        futures[executor.submit(_process_one, next_path, self._get_markdown_filename(next_path))] = next_path
+                    completed += 1
+                    self._handle_result(future, file_path, progress, errors, embedding_batch)
                     
-                    # Submit batch for processing
-                    futures = [executor.submit(process_file_func, file_path) for file_path in batch]
-                    concurrent.futures.wait(futures)
+                    if completed % batch_size == 0:
+                        print(f"Processed {completed} files...")
+                
+                self._collect_embeddings(pending_embeddings, progress, errors)
                 
-                # Save progress after each batch
-                self._save_progress(progress)
+                # Send full batches, and partial ones rather than leaving the embedding model idle
+                if len(embedding_batch) >= self.embedding_batch_size or not pending_embeddings:
+                    self._submit_embeddings(embedding_batch, pending_embeddings)
         
-        # Upload markdown files in parallel
-        if progress:
-            print(f"Uploading {len(progress)} markdown files in batches of {batch_size}...")
-            
-            # Create list of (file_path, md_path) tuples for uploading
-            upload_items = [(file_path, md_path) for file_path, md_path in progress.items()]
+        if processed_any:
+            print(f"Processed {completed} files")
+            self._submit_embeddings(embedding_batch, pending_embeddings)
+            self._collect_embeddings(pending_embeddings, progress, errors, wait=True)
+            self._save_progress(progress)
+        
+        # Skip already uploaded files
+        # Sources with the same name share a markdown file, upload it once
+        upload_items = list(dict.fromkeys(
+            md_path for md_path in progress.values()
+            if md_path not in upload_results or upload_results[md_path].get("status") == "error"
+        ))
+        
+        # Upload markdown files in parallel, several files per request when the uploader
+        # batches them and one task per file otherwise
+        if upload_items:
+            files_per_batch = batch_size if self.file_uploader.batch_uploads else 1
+            upload_batches = self._split_upload_batches(upload_items, files_per_batch)
+            print(f"Uploading {len(upload_items)} markdown files in {len(upload_batches)} batches...")
             
-            # Upload files in parallel
             with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
                 # Create a partial function with shared dictionaries
-                upload_file_func = partial(
-                    self._upload_file,
+                upload_batch_func = partial(
+                    self._upload_batch,
                     upload_results=upload_results,
                     new_upload_results=new_upload_results
                 )
                 
-                # Upload files in batches
-                for i in range(0, len(upload_items), batch_size):
-                    batch = upload_items[i:i+batch_size]
-                    print(f"Uploading batch {i//batch_size + 1}/{(len(upload_items) + batch_size - 1)//batch_size} ({len(batch)} files)...")
-                    
-                    # Submit batch for uploading
-                    futures = [executor.submit(upload_file_func, item) for item in batch]
-                    concurrent.futures.wait(futures)
+                futures = [executor.submit(upload_batch_func, batch) for batch in upload_batches]
+                for uploaded, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+                    future.result()
+                    if uploaded % batch_size == 0:
+                        print(f"Uploaded {uploaded}/{len(upload_batches)} batches...")
                 
-                # Save upload results after each batch
-                self._save_upload_results(upload_results)
+            self._save_upload_results(upload_results)
         
         return progress, errors, new_upload_results
     
-    def add_files_to_knowledge(self, ids, api_url: str, token: str):
-        knowledge_url = f'{api_url}/api/v1/knowledge/a6470419-7149-41de-8de1-e8b44404c7c8/file/add'
-        knowledge_headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-        }
-
-        for id in ids:
-            data = {'file_id': id}
+    def add_files_to_knowledge(self, ids: List[str], api_url: str, token: str, knowledge_id: str, max_workers: int = 16) -> List[Dict[str, Any]]:
+        """
+        Add uploaded files to a knowledge collection, several requests at a time
+        
+        Args:
+            ids: IDs of the uploaded files, duplicates are only added once
+            api_url: Base URL of the API
+            token: Authentication token
+            knowledge_id: ID of the knowledge collection to add the files to
+            max_workers: Number of concurrent requests
+            
+        Returns:
+            List of {"file_id", "error"} dictionaries for files that could not be added
+        """
+        knowledge_url = f'{api_url.rstrip("/")}/api/v1/knowledge/{knowledge_id}/file/add'
+        
+        # Share the uploader's pooled session when there is one, so its connections are reused
+        if isinstance(self.file_uploader, ApiFileUploader):
+            session = self.file_uploader.session
+        else:
+            session = requests.Session()
+            session.verify = _ca_bundle()
+            adapter = _SharedTLSAdapter(session.verify, pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        headers = {'Authorization': f'Bearer {token}'}
+        
+        def add_file(file_id: str) -> Optional[Dict[str, Any]]:
             try:
-                response = requests.post(knowledge_url, headers=knowledge_headers, json=data)
-
+                response = session.post(knowledge_url, json={'file_id': file_id}, headers=headers)
                 response.raise_for_status()
+                return None
+            except requests.HTTPError as e:
+                return {"file_id": file_id, "error": f"{e}: {e.response.text}"}
             except Exception as e:
-                print(e)
-                print(response.json())
\ No newline at end of file
+                return {"file_id": file_id, "error": str(e)}
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(add_file, dict.fromkeys(ids))
+            return [error for error in results if error is not None]
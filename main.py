@@ -5,6 +5,7 @@ from document_processor import (
     ExtensionBasedFileFinder,
     MarkItDownProcessor,
     OllamaEmbeddingGenerator,
+    EmbeddingCache,
     ApiFileUploader,
     DocumentProcessingService
 )
@@ -19,11 +20,18 @@ def main():
     parser.add_argument("--output-dir", default="output", help="Directory to save markdown output")
     parser.add_argument("--enable-plugins", action="store_true", help="Enable MarkItDown plugins")
     parser.add_argument("--embedding-model", default="nomic-embed-text", help="Ollama model to use for embeddings")
+    parser.add_argument("--embed-start-batch", "--embedding-batch-size", type=int, default=32, help="Number of texts per embedding request to start with, adapted to the server")
+    parser.add_argument("--embed-min-batch", type=int, default=1, help="Smallest number of texts per embedding request")
+    parser.add_argument("--embed-max-batch", type=int, default=64, help="Largest number of texts per embedding request")
+    parser.add_argument("--quantize-embeddings", action="store_true", help="Store embeddings as int8 with a per-vector scale")
     parser.add_argument("--api-url", default="http://localhost:3000", help="API URL for uploading files")
     parser.add_argument("--api-token", default="sk-1be9497213bc416cb05b6d64959df11f", help="API token for authentication")
+    parser.add_argument("--knowledge-id", default="a6470419-7149-41de-8de1-e8b44404c7c8", help="Knowledge collection to add uploaded files to")
+    parser.add_argument("--batch-uploads", action="store_true", help="Send several files per upload request, if the API accepts it")
     parser.add_argument("--skip-upload", action="store_true", help="Skip uploading files to API")
-    parser.add_argument("--batch-size", type=int, default=10, help="Number of files to process in parallel")
-    parser.add_argument("--max-workers", type=int, default=None, help="Maximum number of worker threads")
+    parser.add_argument("--batch-size", type=int, default=10, help="Number of files between progress reports and per upload batch (with --batch-uploads)")
+    parser.add_argument("--max-workers", type=int, default=None, help="Maximum number of worker processes (processing) and threads (uploading)")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process", help="Process documents in worker processes or threads")
     args = parser.parse_args()
     
     # Define file types to process (PDF, DOCX, and images)
@@ -37,7 +45,18 @@ def main():
     # Create components
     file_finder = ExtensionBasedFileFinder(extensions)
     document_processor = MarkItDownProcessor(enable_plugins=args.enable_plugins)
-    embedding_generator = OllamaEmbeddingGenerator(model=args.embedding_model, base_url="http://localhost:11434", api_key=None)
+    os.makedirs(args.output_dir, exist_ok=True)
+    embedding_cache = EmbeddingCache(os.path.join(args.output_dir, "embedding_cache.sqlite"))
+    embedding_generator = OllamaEmbeddingGenerator(
+        model=args.embedding_model,
+        base_url="http://localhost:11434",
+        api_key=None,
+        quantize=args.quantize_embeddings,
+        batch_size=args.embed_start_batch,
+        cache=embedding_cache,
+        min_batch_size=args.embed_min_batch,
+        max_batch_size=args.embed_max_batch
+    )
     
     # Create file uploader if not skipped
     file_uploader = None
@@ -45,26 +64,26 @@ def main():
         if not args.api_token:
             print("Warning: API token not provided. File upload will be skipped.")
         else:
-            file_uploader = ApiFileUploader(api_url=args.api_url, token=args.api_token)
+            file_uploader = ApiFileUploader(api_url=args.api_url, token=args.api_token, batch_uploads=args.batch_uploads)
+    
+    # Process all documents in the input directory
+    print(f"\nProcessing documents in '{args.input_dir}' directory...")
+    print(f"Saving markdown output to '{args.output_dir}' directory...")
     
-    processing_service = DocumentProcessingService(
+    # Process documents and get results, releasing the service's journals and threads afterwards
+    with DocumentProcessingService(
         file_finder,
         document_processor,
         embedding_generator,
         file_uploader,
         output_dir=args.output_dir
-    )
-    
-    # Process all documents in the input directory
-    print(f"\nProcessing documents in '{args.input_dir}' directory...")
-    print(f"Saving markdown output to '{args.output_dir}' directory...")
-    
-    # Process documents and get results
-    progress, errors, upload_results = processing_service.process_directory(
-        args.input_dir,
-        batch_size=args.batch_size,
-        max_workers=args.max_workers
-    )
+    ) as processing_service:
+        progress, errors, upload_results = processing_service.process_directory(
+            args.input_dir,
+            batch_size=args.batch_size,
+            max_workers=args.max_workers,
+            executor_type=args.executor
+        )
     
     # Display results
     if not progress:
@@ -100,8 +119,17 @@ def main():
         print("Sleeping 10s before uploading")
         time.sleep(10)
 
-        ids = [upload_results[x]['id'] for x in upload_results]
-        processing_service.add_files_to_knowledge(ids, api_url=args.api_url, token=args.api_token)
+        ids = [result['id'] for result in upload_results.values() if 'id' in result]
+        knowledge_errors = processing_service.add_files_to_knowledge(
+            ids,
+            api_url=args.api_url,
+            token=args.api_token,
+            knowledge_id=args.knowledge_id
+        )
+        if knowledge_errors:
+            print(f"\nFailed to add {len(knowledge_errors)} files to knowledge {args.knowledge_id}:")
+            for error in knowledge_errors:
+                print(f"- {error['file_id']}: {error['error']}")
         
         # Show upload results if any
         if upload_results:
@@ -18,9 +18,11 @@ def main():
     parser.add_argument("--enable-plugins", action="store_true", help="Enable MarkItDown plugins")
     parser.add_argument("--api-url", default="http://localhost:3000", help="API URL for uploading files")
     parser.add_argument("--api-token", default="", help="API token for authentication")
+    parser.add_argument("--batch-uploads", action="store_true", help="Send several files per upload request, if the API accepts it")
     parser.add_argument("--skip-upload", action="store_true", help="Skip uploading files to API")
-    parser.add_argument("--batch-size", type=int, default=10, help="Number of files to process in parallel")
-    parser.add_argument("--max-workers", type=int, default=None, help="Maximum number of worker threads")
+    parser.add_argument("--batch-size", type=int, default=10, help="Number of files between progress reports and per upload batch (with --batch-uploads)")
+    parser.add_argument("--max-workers", type=int, default=None, help="Maximum number of worker processes (processing) and threads (uploading)")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process", help="Process documents in worker processes or threads")
     args = parser.parse_args()
     
     # Define file types to process
@@ -43,16 +45,7 @@ def main():
         if not args.api_token:
             print("Warning: API token not provided. File upload will be skipped.")
         else:
-            file_uploader = ApiFileUploader(api_url=args.api_url, token=args.api_token)
-    
-    # Create the service by injecting dependencies
-    processing_service = DocumentProcessingService(
-        file_finder,
-        document_processor,
-        embedding_generator,
-        file_uploader,
-        output_dir=args.output_dir
-    )
+            file_uploader = ApiFileUploader(api_url=args.api_url, token=args.api_token, batch_uploads=args.batch_uploads)
     
     # Process all documents in the input directory
     print(f"Processing documents in '{args.input_dir}' directory...")
@@ -60,12 +53,21 @@ def main():
     if file_uploader:
         print(f"Uploading markdown files to API at {args.api_url}")
     
-    # Process documents and get results
-    progress, errors, upload_results = processing_service.process_directory(
-        args.input_dir,
-        batch_size=args.batch_size,
-        max_workers=args.max_workers
-    )
+    # Create the service by injecting dependencies, and process documents and get
+    # results, releasing the service's journals and threads afterwards
+    with DocumentProcessingService(
+        file_finder,
+        document_processor,
+        embedding_generator,
+        file_uploader,
+        output_dir=args.output_dir
+    ) as processing_service:
+        progress, errors, upload_results = processing_service.process_directory(
+            args.input_dir,
+            batch_size=args.batch_size,
+            max_workers=args.max_workers,
+            executor_type=args.executor
+        )
     
     # Display results
     if not progress: